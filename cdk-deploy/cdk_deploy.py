@@ -3,460 +3,285 @@ import sys
 import yaml
 import json
 import glob
+import re
+import copy
+import functools
+import logging
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Any, Optional
-import boto3
-import aws_cdk as cdk
-from aws_cdk import (
-    Stack,
-    aws_imagebuilder as imagebuilder,
-    aws_iam as iam,
-    aws_ec2 as ec2,
-    aws_logs as logs,
-    CfnOutput
-)
-from constructs import Construct
+from typing import ClassVar, Dict, List, Any, Optional, Tuple
+
+# libyaml (C 実装) が利用可能であれば高速な CSafeLoader を使用する
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+# JSON キャッシュの読み書きには orjson が利用可能であればそれを使用する
+# どちらの実装でも JSON で表せない値（日付など）は TypeError とし、
+# 文字列以外のキーなど JSON を経由すると変わる値は書き込み前の往復比較でキャッシュ対象から外す
+try:
+    import orjson
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        # 標準の json と同様に日付を ISO 文字列へ変換せずエラーとする
+        return orjson.dumps(obj, option=orjson.OPT_PASSTHROUGH_DATETIME)
+except ImportError:
+    _json_loads = json.loads
+
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+
+
+# ImageBuilderManager が保持する解析済み YAML の最大件数
+_YAML_CACHE_MAX_ENTRIES = 100
+
+# バージョンファイル名の形式 (major.minor.patch)
+_VER_RE = re.compile(r'^(\d+)\.(\d+)\.(\d+)$')
+
+
+def _parse_version(version: str) -> Optional[Tuple[int, ...]]:
+    """バージョン文字列を比較用のタプルに変換（形式が不正な場合は None）"""
+    match = _VER_RE.match(version)
+    if not match:
+        return None
+    return tuple(int(x) for x in match.groups())
+
+
+def _version_key(version: str) -> Tuple[int, ...]:
+    """バージョン文字列を比較用のタプルに変換"""
+    key = _parse_version(version)
+    if key is None:
+        raise ValueError(f"Invalid version format: {version}")
+    return key
 
-# boto3で既存リソースのARNを保持するためのヘルパークラス
-class ExistingImageBuilderComponent:
-    def __init__(self, arn: str):
-        self._arn = arn
-    
-    @property
-    def attr_arn(self):
-        return self._arn
 
-class ExistingImageBuilderRecipe:
-    def __init__(self, arn: str):
-        self._arn = arn
+@functools.lru_cache(maxsize=None)
+def _scan_versions(dir_path: str) -> Tuple[str, ...]:
+    """
+    ディレクトリ内の YAML ファイル名（拡張子なし）をバージョンとして取得する。
+    major.minor.patch 形式でないファイルは無視する。
+    各バージョンは走査時に一度だけ解析し、古い順にソートした結果をキャッシュするため、
+    最新バージョンは末尾の要素となる。
+    """
+    try:
+        with os.scandir(dir_path) as it:
+            stems = [e.name[:-5] for e in it if e.name.endswith('.yaml') and e.is_file()]
+    except FileNotFoundError:
+        return ()
     
-    @property
-    def attr_arn(self):
-        return self._arn
+    pairs = []
+    for stem in stems:
+        key = _parse_version(stem)
+        if key is not None:
+            pairs.append((key, stem))
+    pairs.sort()
+    return tuple(version for _, version in pairs)
+
+
+@functools.lru_cache(maxsize=None)
+def _latest_version(versions: Tuple[str, ...]) -> str:
+    """バージョンのタプルから最新バージョンを取得（結果はキャッシュ）"""
+    return max((_version_key(v), v) for v in versions)[1]
 
 
 class ImageBuilderManager:
     """レシピとコンポーネントファイルの管理クラス"""
     
+    # 解析済み YAML の LRU キャッシュ: 絶対パス -> (mtime, size, parsed)
+    # 複数のインスタンス（複数スタックの合成など）で共有するためクラス属性として保持する
+    _yaml_cache: ClassVar["OrderedDict[Path, Tuple[float, int, Dict[str, Any]]]"] = OrderedDict()
+    
     def __init__(self, base_path: str = "../my-app"):
         self.base_path = Path(base_path)
         self.components_path = self.base_path / "components"
         self.recipes_path = self.base_path / "recipes"
     
+    @classmethod
+    def clear_cache(cls) -> None:
+        """バージョン一覧と解析済み YAML のキャッシュを破棄（テストやファイル追加後の再走査用）"""
+        _scan_versions.cache_clear()
+        _latest_version.cache_clear()
+        cls._yaml_cache.clear()
+    
+    def _load_yaml(self, path: Path) -> Dict[str, Any]:
+        """
+        YAML ファイルを読み込む。mtime とサイズが変わっていなければキャッシュ済みの結果を返す。
+        呼び出し側での変更がキャッシュに波及しないよう、返り値は常にコピーとする。
+        """
+        st = path.stat()
+        key = (st.st_mtime, st.st_size)
+        # キャッシュはインスタンス間で共有するため、base_path や作業ディレクトリに依らない絶対パスをキーとする
+        cache_key = path.resolve()
+        
+        cached = self._yaml_cache.get(cache_key)
+        if cached is not None and cached[:2] == key:
+            self._yaml_cache.move_to_end(cache_key)
+            return copy.deepcopy(cached[2])
+        
+        if os.environ.get('IMAGEBUILDER_JSON_CACHE') == '1':
+            data = self._load_via_json_sidecar(path, st)
+        else:
+            data = self._parse_yaml_file(path)
+        
+        self._yaml_cache[cache_key] = (*key, data)
+        self._yaml_cache.move_to_end(cache_key)
+        if len(self._yaml_cache) > _YAML_CACHE_MAX_ENTRIES:
+            self._yaml_cache.popitem(last=False)
+        return copy.deepcopy(data)
+    
+    @staticmethod
+    def _parse_yaml_file(path: Path) -> Dict[str, Any]:
+        """YAML ファイルを解析"""
+        with open(path, 'rb') as f:
+            return yaml.load(f, Loader=_Loader)
+    
+    def _load_via_json_sidecar(self, path: Path, st: os.stat_result) -> Dict[str, Any]:
+        """
+        YAML の隣に置いた JSON キャッシュ (<version>.yaml.json) に記録された元ファイルの
+        mtime (ns) とサイズが現在の YAML と一致すればそれを読み込む。
+        無い・一致しない場合は YAML を解析して JSON キャッシュを書き出す（IMAGEBUILDER_JSON_CACHE=1 の場合のみ使用）。
+        """
+        cache_json = path.with_suffix('.yaml.json')
+        try:
+            cached = _json_loads(cache_json.read_bytes())
+            if cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+                return cached['data']
+        except (OSError, ValueError, TypeError, KeyError):
+            # キャッシュが無い・壊れている・旧形式の場合は YAML を解析し直す
+            pass
+        
+        data = self._parse_yaml_file(path)
+        try:
+            blob = _json_dumps({'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'data': data})
+            # JSON を経由すると値が変わってしまう YAML（文字列以外のキーなど）はキャッシュしない
+            if _json_loads(blob)['data'] == data:
+                # 並行して synth が走っても壊れたキャッシュを読まないよう、一時ファイル経由で置き換える
+                tmp_json = cache_json.with_name(f"{cache_json.name}.{os.getpid()}.tmp")
+                tmp_json.write_bytes(blob)
+                os.replace(tmp_json, cache_json)
+        except (OSError, TypeError, ValueError):
+            # 書き込めない環境や、JSON で表せない値（日付など）を含む YAML ではキャッシュしない
+            pass
+        return data
+    
     def get_latest_version(self, versions: List[str]) -> str:
         """バージョンリストから最新バージョンを取得"""
-        def version_key(v):
-            return tuple(map(int, v.split('.')))
-        
-        return max(versions, key=version_key)
+        return _latest_version(tuple(versions))
     
     def get_component_versions(self, component_name: str) -> List[str]:
         """コンポーネントの利用可能バージョンを取得"""
-        component_dir = self.components_path / component_name
-        if not component_dir.exists():
-            return []
-        
-        versions = []
-        for yaml_file in component_dir.glob("*.yaml"):
-            version = yaml_file.stem
-            versions.append(version)
-        
-        return versions
+        return list(_scan_versions(str(self.components_path / component_name)))
     
     def get_recipe_versions(self) -> List[str]:
         """レシピの利用可能バージョンを取得"""
-        versions = []
-        for yaml_file in self.recipes_path.glob("*.yaml"):
-            version = yaml_file.stem
-            versions.append(version)
-        
-        return versions
+        return list(_scan_versions(str(self.recipes_path)))
     
     def load_component(self, component_name: str, version: str = "x.x.x") -> Dict[str, Any]:
         """コンポーネントファイルを読み込み"""
         if version == "x.x.x":
-            available_versions = self.get_component_versions(component_name)
+            available_versions = _scan_versions(str(self.components_path / component_name))
             if not available_versions:
                 raise ValueError(f"Component {component_name} not found")
-            version = self.get_latest_version(available_versions)
+            version = available_versions[-1]
         
         component_file = self.components_path / component_name / f"{version}.yaml"
         
         if not component_file.exists():
             raise FileNotFoundError(f"Component file not found: {component_file}")
         
-        with open(component_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return self._load_yaml(component_file)
     
     def load_recipe(self, version: str = "latest") -> Dict[str, Any]:
         """レシピファイルを読み込み"""
         if version == "latest":
-            available_versions = self.get_recipe_versions()
+            available_versions = _scan_versions(str(self.recipes_path))
             if not available_versions:
                 raise ValueError("No recipe files found")
-            version = self.get_latest_version(available_versions)
+            version = available_versions[-1]
         
         recipe_file = self.recipes_path / f"{version}.yaml"
         
         if not recipe_file.exists():
             raise FileNotFoundError(f"Recipe file not found: {recipe_file}")
         
-        with open(recipe_file, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        return self._load_yaml(recipe_file)
     
     def resolve_recipe_components(self, recipe: Dict[str, Any]) -> Dict[str, Any]:
-        """レシピ内のコンポーネントバージョンを解決"""
+        """
+        レシピ内のコンポーネントバージョンを解決する。
+        解決後のレシピには (コンポーネント名, バージョン) の平坦なリスト '_flat_components' を付与する。
+        """
+        # x.x.x 指定が一つも無ければ解決の必要はないため、レシピの内容をそのまま使う
+        needs_resolution = any(
+            info.get('Version', 'x.x.x') == "x.x.x"
+            for component_config in recipe.get('Components', [])
+            for info in component_config.values()
+        )
+        if not needs_resolution and 'Components' in recipe:
+            return {**recipe, '_flat_components': self._flatten_components(recipe['Components'])}
+        
+        # 呼び出し元のレシピを変更しないよう Components だけを一度コピーし、その中で書き換える
         resolved_recipe = recipe.copy()
-        resolved_components = []
+        resolved_recipe['Components'] = copy.deepcopy(recipe.get('Components', []))
         
-        for component_config in recipe.get('Components', []):
+        for component_config in resolved_recipe['Components']:
             for component_name, component_info in component_config.items():
-                component_version = component_info.get('Version', 'x.x.x')
+                # バージョンが確定しているエントリはそのまま
+                if component_info.get('Version', 'x.x.x') != "x.x.x":
+                    continue
                 
                 # バージョンが x.x.x の場合は最新バージョンを取得
-                if component_version == "x.x.x":
-                    available_versions = self.get_component_versions(component_name)
-                    if available_versions:
-                        component_version = self.get_latest_version(available_versions)
-                
-                resolved_components.append({
-                    component_name: {
-                        'Version': component_version
-                    }
-                })
+                available_versions = _scan_versions(str(self.components_path / component_name))
+                component_info['Version'] = available_versions[-1] if available_versions else "x.x.x"
         
-        resolved_recipe['Components'] = resolved_components
+        resolved_recipe['_flat_components'] = self._flatten_components(resolved_recipe['Components'])
         return resolved_recipe
-
-class ImageBuilderStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, recipe_data: Dict[str, Any], 
-                 components_data: Dict[str, Dict[str, Any]], **kwargs) -> None:
-        super().__init__(scope, construct_id, **kwargs)
-        
-        self.recipe_data = recipe_data
-        self.components_data = components_data
-        
-        # self.account と self.region は Stack のコンストラクタによって自動的に設定される
-        # 必要に応じて明示的に設定することも可能だが、通常は不要
-        # self.account = cdk.Aws.ACCOUNT_ID 
-        # self.region = cdk.Aws.REGION
-
-        # boto3 Imagebuilder クライアントを初期化
-        self.imagebuilder_client = boto3.client('imagebuilder', region_name=self.region)
-        
-        # IAM Role for Image Builder
-        self.image_builder_role = self._create_image_builder_role()
-        
-        # Instance Profile
-        self.instance_profile = self._create_instance_profile()
-        
-        # Components
-        self.components = self._create_components()
-        
-        # Recipe
-        self.recipe = self._create_recipe()
-        
-        # Infrastructure Configuration
-        self.infrastructure_config = self._create_infrastructure_config()
-        
-        # Distribution Configuration
-        self.distribution_config = self._create_distribution_config()
-        
-        # Image Pipeline
-        self.image_pipeline = self._create_image_pipeline()
-        
-        # Outputs
-        self._create_outputs()
-    
-    def _create_image_builder_role(self) -> iam.Role:
-        """Image Builder用のIAMロールを作成"""
-        role = iam.Role(
-            self, "ImageBuilderRole",
-            assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
-            managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name("EC2InstanceProfileForImageBuilder"),
-                iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSSMManagedInstanceCore")
-            ]
-        )
-        
-        # CloudWatch Logs への書き込み権限を追加
-        role.add_to_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=[
-                    "logs:CreateLogGroup",
-                    "logs:CreateLogStream",
-                    "logs:PutLogEvents"
-                ],
-                resources=["*"]
-            )
-        )
-        
-        return role
-    
-    def _create_instance_profile(self) -> iam.CfnInstanceProfile:
-        """インスタンスプロファイルを作成"""
-        return iam.CfnInstanceProfile(
-            self, "ImageBuilderInstanceProfile",
-            roles=[self.image_builder_role.role_name]
-        )
     
-    def _get_existing_component_arn(self, name: str, version: str) -> Optional[str]:
-        """
-        指定された名前とバージョンの既存コンポーネントのARNを取得する。
-        見つからない場合はNoneを返す。
-        """
-        try:
-            # まずフィルターなしで全てのコンポーネントを取得してデバッグ
-            paginator = self.imagebuilder_client.get_paginator('list_components')
-            response_iterator = paginator.paginate()
-            
-            print(f"DEBUG: Searching for component: {name} v{version}")
-            
-            for page in response_iterator:
-                components = page.get('componentVersionList', [])
-                print(f"DEBUG: Found {len(components)} total components")
-                
-                for component_summary in components:
-                    print(f"DEBUG: Component found - Name: {component_summary.get('name')}, Version: {component_summary.get('version')}, Owner: {component_summary.get('owner')}")
-                    if component_summary['name'] == name and component_summary['version'] == version:
-                        print(f"DEBUG: Match found! ARN: {component_summary['arn']}")
-                        return component_summary['arn']
-            
-            print(f"DEBUG: No matching component found for {name} v{version}")
-            return None
-            
-        except self.imagebuilder_client.exceptions.ClientError as e:
-            print(f"Warning: An AWS client error occurred calling list_components: {e}", file=sys.stderr)
-            return None
-        except Exception as e:
-            print(f"Warning: Could not list Image Builder components. Error: {e}", file=sys.stderr)
-            return None
+    @staticmethod
+    def _flatten_components(components: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """Components (名前をキーとする辞書のリスト) を (名前, バージョン) のリストに変換"""
+        return [
+            (component_name, component_info['Version'])
+            for component_config in components
+            for component_name, component_info in component_config.items()
+        ]
 
-    def _get_existing_recipe_arn(self, name: str, version: str) -> Optional[str]:
-        """
-        指定された名前とバージョンの既存レシピのARNを取得する。
-        見つからない場合はNoneを返す。
-        """
-        try:
-            # list_image_recipes での検索も継続
-            print(f"DEBUG: Searching for recipe via list_image_recipes: {name} v{version}")
-            
-            # ページネーション無しで試す
-            # try:
-            #     response = self.imagebuilder_client.list_image_recipes(owner='Self')
-            #     recipes = response.get('imageRecipeSummaryList', [])
-            #     print(f"DEBUG: Found {len(recipes)} total recipes via list_image_recipes")
-                
-            #     for recipe_summary in recipes:
-            #         arn = recipe_summary['arn']
-            #         # ARN形式: arn:aws:imagebuilder:region:account:image-recipe/name/version
-            #         version_from_arn = arn.split('/')[-1]
-                    
-            #         print(f"DEBUG: Recipe found - Name: {recipe_summary.get('name')}, Version: {version_from_arn}, Owner: {recipe_summary.get('owner')}")
-            #         if recipe_summary['name'] == name and version_from_arn == version:
-            #             print(f"DEBUG: Match found! ARN: {arn}")
-            #             return arn
 
-            # except Exception as list_error:
-            #     print(f"DEBUG: list_image_recipes (no pagination) failed: {list_error}")
-            
-            # ページネーション有りでの検索
-            try:
-                paginator = self.imagebuilder_client.get_paginator('list_image_recipes')
-                response_iterator = paginator.paginate()
-                
-                for page in response_iterator:
-                    recipes = page.get('imageRecipeSummaryList', [])
-                    print(f"DEBUG: Found {len(recipes)} recipes in this page")
-                    
-                    for recipe_summary in recipes:
-                        version_from_arn = recipe_summary['arn'].split('/')[-1]
-                        print(f"DEBUG: Recipe found - Name: {recipe_summary.get('name')}, Version: {version_from_arn}")
-                        if recipe_summary['name'] == name and version_from_arn == version:
-                            print(f"DEBUG: Match found! ARN: {recipe_summary['arn']}")
-                            return recipe_summary['arn']
-            except Exception as paginator_error:
-                print(f"DEBUG: paginated list_image_recipes failed: {paginator_error}")
-            
-            # 直接get_image_recipeを試す方法も追加
-            expected_arn = f"arn:aws:imagebuilder:{self.region}:{self.account}:image-recipe/{name}/{version}"
-            try:
-                response = self.imagebuilder_client.get_image_recipe(imageRecipeArn=expected_arn)
-                if response and 'imageRecipe' in response:
-                    print(f"DEBUG: Found recipe via direct ARN lookup: {expected_arn}")
-                    return expected_arn
-            except self.imagebuilder_client.exceptions.ResourceNotFoundException:
-                print(f"DEBUG: Recipe not found via direct ARN lookup: {expected_arn}")
-            except Exception as direct_error:
-                print(f"DEBUG: Direct ARN lookup failed: {direct_error}")
-            
-            print(f"DEBUG: No matching recipe found for {name} v{version}")
-            return None
-            
-        except self.imagebuilder_client.exceptions.ClientError as e:
-            print(f"Warning: An AWS client error occurred: {e}", file=sys.stderr)
-            return None
-        except Exception as e:
-            print(f"Warning: Could not check for existing recipe. Error: {e}", file=sys.stderr)
-            return None
+# ImageBuilderStack などは aws_cdk / boto3 に依存するため image_builder_stack に分離している。
+# ImageBuilderManager だけを使うツール（検証・lint など）がそれらの import コストを払わないよう、
+# 従来の cdk_deploy.ImageBuilderStack 等での参照は初回アクセス時に遅延 import する。
+_LAZY_STACK_ATTRS = ("ImageBuilderStack", "ExistingImageBuilderComponent", "ExistingImageBuilderRecipe")
 
-    def _create_components(self) -> Dict[str, Any]: # 戻り値の型を CfnComponent から Any に変更
-        """コンポーネントを作成（既存の場合は参照）"""
-        components = {}
-        
-        for component_name, component_data in self.components_data.items():
-            version = component_data['Version']
-            # _get_existing_component_arn から返されるのはビルドバージョンARN
-            existing_arn = self._get_existing_component_arn(component_name, version)
-            
-            if existing_arn:
-                print(f"Component '{component_name}' v{version}' already exists. Using ARN: {existing_arn}")
-                # 既存のARNを使用するダミーオブジェクトを作成
-                components[component_name] = ExistingImageBuilderComponent(existing_arn)
-            else:
-                print(f"Creating new Component '{component_name}' v{version}'...")
-                component = imagebuilder.CfnComponent(
-                    self, f"Component{component_name}",
-                    name=component_data['Name'],
-                    platform=component_data['Platform'],
-                    version=component_data['Version'],
-                    data=component_data['Data']
-                )
-                components[component_name] = component
-        
-        return components
-    
-    def _create_recipe(self) -> Any: # 戻り値の型を CfnImageRecipe から Any に変更
-        """レシピを作成（既存の場合は参照）"""
-        recipe_name = self.recipe_data['Name']
-        recipe_version = self.recipe_data['Version']
-        existing_arn = self._get_existing_recipe_arn(recipe_name, recipe_version)
-
-        if existing_arn:
-            print(f"Image Recipe '{recipe_name}' v{recipe_version}' already exists. Using ARN: {existing_arn}")
-            self.recipe = ExistingImageBuilderRecipe(existing_arn) # self.recipe に直接設定
-        else:
-            print(f"Creating new Image Recipe '{recipe_name}' v{recipe_version}'...")
-            # コンポーネント参照を構築
-            component_refs = []
-            for component_config in self.recipe_data['Components']:
-                for component_name, component_info in component_config.items():
-                    if component_name in self.components:
-                        component_refs.append(
-                            imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
-                                component_arn=self.components[component_name].attr_arn
-                            )
-                        )
-            
-            # ブロックデバイスマッピング
-            block_device_mappings = []
-            for mapping in self.recipe_data.get('BlockDeviceMappings', []):
-                ebs_config = mapping.get('Ebs', {})
-                block_device_mappings.append(
-                    imagebuilder.CfnImageRecipe.InstanceBlockDeviceMappingProperty(
-                        device_name=mapping['DeviceName'],
-                        ebs=imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty(
-                            delete_on_termination=ebs_config.get('DeleteOnTermination', True),
-                            volume_size=ebs_config.get('VolumeSize', 20),
-                            volume_type=ebs_config.get('VolumeType', 'gp3')
-                        )
-                    )
-                )
-            
-            self.recipe = imagebuilder.CfnImageRecipe( # self.recipe に直接設定
-                self, "ImageRecipe",
-                name=recipe_name,
-                version=recipe_version,
-                parent_image=f"arn:aws:imagebuilder:{self.region}:aws:image/{self.recipe_data['ParentImage']['Name']}/{self.recipe_data['ParentImage']['Version']}",
-                components=component_refs,
-                block_device_mappings=block_device_mappings if block_device_mappings else None
-            )
-        
-        return self.recipe
 
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_STACK_ATTRS:
+        import image_builder_stack
+        return getattr(image_builder_stack, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    def _create_infrastructure_config(self) -> imagebuilder.CfnInfrastructureConfiguration:
-        """インフラストラクチャ設定を作成"""
-        # デフォルトVPCとサブネットを取得
-        vpc = ec2.Vpc.from_lookup(self, "DefaultVPC", is_default=True)
-        
-        # CloudWatch Logs Group
-        log_group = logs.LogGroup(
-            self, "ImageBuilderLogGroup",
-            retention=logs.RetentionDays.ONE_WEEK
-        )
-        
-        return imagebuilder.CfnInfrastructureConfiguration(
-            self, "InfrastructureConfig",
-            name=f"{self.recipe_data['Name']}-infrastructure",
-            instance_profile_name=self.instance_profile.ref,
-            instance_types=["t3.medium"],
-            subnet_id=vpc.public_subnets[0].subnet_id,
-            security_group_ids=[
-                "sg-0a43fd22ebc3702be", # このSGがImage Builderインスタンスからの必要な通信を許可しているか確認
-            ],
-            terminate_instance_on_failure=True,
-            # logging=imagebuilder.CfnInfrastructureConfiguration.LoggingProperty(
-            #     cloud_watch_logs=imagebuilder.CfnInfrastructureConfiguration.CloudWatchLogsProperty(
-            #         log_group_name=log_group.log_group_name
-            #     )
-            # )
-        )
-    
-    def _create_distribution_config(self) -> imagebuilder.CfnDistributionConfiguration:
-        """配布設定を作成"""
-        return imagebuilder.CfnDistributionConfiguration(
-            self, "DistributionConfig",
-            name=f"{self.recipe_data['Name']}-distribution",
-            distributions=[
-                imagebuilder.CfnDistributionConfiguration.DistributionProperty(
-                    region=self.region,
-                    ami_distribution_configuration=imagebuilder.CfnDistributionConfiguration.AmiDistributionConfigurationProperty(
-                        name=f"{self.recipe_data['Name']} {{{{ imagebuilder:buildDate }}}}",
-                        description=f"Generated by Image Builder Pipeline for {self.recipe_data['Name']}"
-                    )
-                )
-            ]
-        )
-    
-    def _create_image_pipeline(self) -> imagebuilder.CfnImagePipeline:
-        """イメージパイプラインを作成"""
-        return imagebuilder.CfnImagePipeline(
-            self, "ImagePipeline",
-            name=f"{self.recipe_data['Name']}-pipeline",
-            image_recipe_arn=self.recipe.attr_arn,
-            infrastructure_configuration_arn=self.infrastructure_config.attr_arn,
-            distribution_configuration_arn=self.distribution_config.attr_arn,
-            status="ENABLED"
-        )
-    
-    def _create_outputs(self):
-        """スタックの出力を作成"""
-        if isinstance(self.image_pipeline, imagebuilder.CfnImagePipeline):
-            CfnOutput(
-                self, "ImagePipelineArn",
-                value=self.image_pipeline.attr_arn,
-                description="Image Builder Pipeline ARN"
-            )
-        
-        if isinstance(self.recipe, imagebuilder.CfnImageRecipe):
-            CfnOutput(
-                self, "ImageRecipeArn",
-                value=self.recipe.attr_arn,
-                description="Image Recipe ARN"
-            )
-        else: 
-             CfnOutput(
-                self, "ImageRecipeArn",
-                value=self.recipe.attr_arn, 
-                description="Image Recipe ARN (Existing)"
-            )
 
 def main():
+    # aws_cdk / boto3 の import は重いため、スタックを合成する場合にのみ読み込む
+    import aws_cdk as cdk
+    from image_builder_stack import ImageBuilderStack
+    
     # 環境変数から設定を取得
     recipe_version = os.environ.get('RECIPE_VERSION', 'latest')
     
+    # LOG_LEVEL (DEBUG / INFO / WARNING ...) はこのプロジェクトのロガーにのみ適用する
+    # ルートロガーに設定すると botocore / urllib3 の DEBUG ログ（署名済みリクエストヘッダーを含む）まで出力されるため、
+    # ルートは WARNING のままとする
+    logging.basicConfig(
+        level=logging.WARNING,
+        format="%(levelname)s: %(name)s: %(message)s",
+        stream=sys.stderr
+    )
+    logging.getLogger('image_builder_stack').setLevel(
+        getattr(logging, os.environ.get('LOG_LEVEL', 'WARNING').upper(), logging.WARNING)
+    )
+    
     try:
         # Image Builder Manager を初期化
         manager = ImageBuilderManager()
@@ -469,12 +294,10 @@ def main():
         
         # 必要なコンポーネントを読み込み
         components_data = {}
-        for component_config in resolved_recipe['Components']:
-            for component_name, component_info in component_config.items():
-                component_version = component_info['Version']
-                component_data = manager.load_component(component_name, component_version)
-                components_data[component_name] = component_data
-                print(f"Loaded component: {component_name} v{component_version}")
+        for component_name, component_version in resolved_recipe['_flat_components']:
+            component_data = manager.load_component(component_name, component_version)
+            components_data[component_name] = component_data
+            print(f"Loaded component: {component_name} v{component_version}")
         
         # CDK アプリケーションを作成
         app = cdk.App()
@@ -0,0 +1,411 @@
+import os
+import functools
+import logging
+from typing import Dict, Any, Optional, Tuple
+import boto3
+import boto3.session
+import botocore.config
+import aws_cdk as cdk
+from aws_cdk import (
+    Stack,
+    aws_imagebuilder as imagebuilder,
+    aws_iam as iam,
+    aws_ec2 as ec2,
+    CfnOutput
+)
+from constructs import Construct
+
+logger = logging.getLogger(__name__)
+
+# boto3 クライアントの生成（サービスモデルの読み込み）は重いため、
+# プロセス内で一つのセッションを共有し、リージョンごとにクライアントを使い回す
+_SESSION = boto3.session.Session()
+
+# スロットリング時は adaptive モードでリトライし、ページ間で接続 (TLS セッション) を再利用する
+_BOTO_CFG = botocore.config.Config(
+    retries={'mode': 'adaptive', 'max_attempts': 10},
+    max_pool_connections=20,
+    tcp_keepalive=True
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _ib_client(region: str):
+    """リージョンごとに共有される Image Builder クライアントを取得"""
+    return _SESSION.client('imagebuilder', region_name=region, config=_BOTO_CFG)
+
+
+# list_components / list_image_recipes の 1 ページあたりの件数 (API の maxResults 上限は 25)
+_LIST_PAGE_SIZE = 25
+# filters の values に指定できる最大件数
+_FILTER_MAX_VALUES = 10
+
+
+# boto3で既存リソースのARNを保持するためのヘルパークラス
+class ExistingImageBuilderComponent:
+    def __init__(self, arn: str):
+        self._arn = arn
+    
+    @property
+    def attr_arn(self):
+        return self._arn
+
+class ExistingImageBuilderRecipe:
+    def __init__(self, arn: str):
+        self._arn = arn
+    
+    @property
+    def attr_arn(self):
+        return self._arn
+
+class ImageBuilderStack(Stack):
+    # ブロックデバイスの Ebs 設定のデフォルト値
+    _DEFAULT_EBS_CONFIG = {'DeleteOnTermination': True, 'VolumeSize': 20, 'VolumeType': 'gp3'}
+    # デフォルト値どおりのマッピングで共有する Ebs プロパティ
+    _DEFAULT_EBS = imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty(
+        delete_on_termination=_DEFAULT_EBS_CONFIG['DeleteOnTermination'],
+        volume_size=_DEFAULT_EBS_CONFIG['VolumeSize'],
+        volume_type=_DEFAULT_EBS_CONFIG['VolumeType']
+    )
+    
+    def __init__(self, scope: Construct, construct_id: str, recipe_data: Dict[str, Any], 
+                 components_data: Dict[str, Dict[str, Any]], **kwargs) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        
+        self.recipe_data = recipe_data
+        self.components_data = components_data
+        
+        # self.account と self.region は Stack のコンストラクタによって自動的に設定される
+        # 必要に応じて明示的に設定することも可能だが、通常は不要
+        # self.account = cdk.Aws.ACCOUNT_ID 
+        # self.region = cdk.Aws.REGION
+
+        # boto3 Imagebuilder クライアントを初期化
+        self.imagebuilder_client = _ib_client(self.region)
+        
+        # 既存コンポーネントの (name, version) -> ARN インデックス（初回参照時に作成）
+        self._component_index: Optional[Dict[Tuple[str, str], str]] = None
+        
+        # 自アカウントの ARN 接頭辞 (arn:<partition>:imagebuilder:<region>:<account>) は一度だけ組み立てる
+        partition = self.partition
+        if cdk.Token.is_unresolved(partition):
+            # boto3 での検索には実際の値が必要なため、リージョンからパーティションを求める
+            partition = _SESSION.get_partition_for_region(self.region)
+        self._partition = partition
+        self._arn_prefix = f"arn:{partition}:imagebuilder:{self.region}:{self.account}"
+        
+        # 既存レシピを先に検索する。既存コンポーネントの索引（list_components の走査）は
+        # レシピを新規作成する場合にのみ必要なため、_create_components から初回参照時に作成する
+        self._existing_recipe_arn = self._get_existing_recipe_arn(
+            self.recipe_data['Name'], self.recipe_data['Version']
+        )
+        
+        # IAM Role for Image Builder
+        self.image_builder_role = self._create_image_builder_role()
+        
+        # Instance Profile
+        self.instance_profile = self._create_instance_profile()
+        
+        # Components
+        # 既存レシピを使う場合、新しく作成したコンポーネントはどのレシピからも参照されないため作成しない
+        self.components = {} if self._existing_recipe_arn else self._create_components()
+        
+        # Recipe
+        self.recipe = self._create_recipe()
+        
+        # Infrastructure Configuration
+        self.infrastructure_config = self._create_infrastructure_config()
+        
+        # Distribution Configuration
+        self.distribution_config = self._create_distribution_config()
+        
+        # Image Pipeline
+        self.image_pipeline = self._create_image_pipeline()
+        
+        # Outputs
+        self._create_outputs()
+    
+    def _create_image_builder_role(self) -> iam.Role:
+        """Image Builder用のIAMロールを作成"""
+        role = iam.Role(
+            self, "ImageBuilderRole",
+            assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("EC2InstanceProfileForImageBuilder"),
+                iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSSMManagedInstanceCore")
+            ]
+        )
+        
+        # CloudWatch Logs への書き込み権限を追加
+        role.add_to_policy(
+            iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=[
+                    "logs:CreateLogGroup",
+                    "logs:CreateLogStream",
+                    "logs:PutLogEvents"
+                ],
+                resources=["*"]
+            )
+        )
+        
+        return role
+    
+    def _create_instance_profile(self) -> iam.CfnInstanceProfile:
+        """インスタンスプロファイルを作成"""
+        return iam.CfnInstanceProfile(
+            self, "ImageBuilderInstanceProfile",
+            roles=[self.image_builder_role.role_name]
+        )
+    
+    def _index_existing_components(self) -> Dict[Tuple[str, str], str]:
+        """
+        このスタックで使用するコンポーネント名でサーバー側フィルタして自アカウントのコンポーネントを走査し、
+        (name, version) -> ARN の辞書を作成する（スタック単位でメモ化）。
+        """
+        if self._component_index is not None:
+            return self._component_index
+        
+        index = {}
+        names = list(self.components_data)
+        debug = logger.isEnabledFor(logging.DEBUG)
+        try:
+            paginator = self.imagebuilder_client.get_paginator('list_components')
+            # フィルタの values は 1 回の呼び出しにつき最大 10 件まで
+            for i in range(0, len(names), _FILTER_MAX_VALUES):
+                response_iterator = paginator.paginate(
+                    owner='Self',
+                    filters=[{'name': 'name', 'values': names[i:i + _FILTER_MAX_VALUES]}],
+                    PaginationConfig={'PageSize': _LIST_PAGE_SIZE}
+                )
+                for page in response_iterator:
+                    for component_summary in page.get('componentVersionList', []):
+                        if debug:
+                            logger.debug("Component found - Name: %s, Version: %s, Owner: %s",
+                                         component_summary.get('name'), component_summary.get('version'), component_summary.get('owner'))
+                        index[(component_summary['name'], component_summary['version'])] = component_summary['arn']
+            
+            logger.debug("Indexed %d existing components", len(index))
+            
+        except self.imagebuilder_client.exceptions.ClientError as e:
+            logger.warning("An AWS client error occurred calling list_components: %s", e)
+        except Exception as e:
+            logger.warning("Could not list Image Builder components. Error: %s", e)
+        
+        self._component_index = index
+        return index
+
+    def _find_recipe_arn_by_name(self, name: str, version: str) -> Optional[str]:
+        """
+        list_image_recipes を名前でサーバー側フィルタして該当バージョンを探す。
+        list_image_recipes は version でのフィルタをサポートしていないため、バージョンはページ内で照合し、
+        一致した時点でページングを打ち切る。
+        """
+        try:
+            paginator = self.imagebuilder_client.get_paginator('list_image_recipes')
+            response_iterator = paginator.paginate(
+                owner='Self',
+                filters=[{'name': 'name', 'values': [name]}],
+                PaginationConfig={'PageSize': _LIST_PAGE_SIZE}
+            )
+            
+            for page in response_iterator:
+                for recipe_summary in page.get('imageRecipeSummaryList', []):
+                    # ARN形式: arn:partition:imagebuilder:region:account:image-recipe/name/version
+                    if recipe_summary['name'] == name and recipe_summary['arn'].split('/')[-1] == version:
+                        return recipe_summary['arn']
+            
+        except self.imagebuilder_client.exceptions.ClientError as e:
+            logger.warning("An AWS client error occurred calling list_image_recipes: %s", e)
+        except Exception as e:
+            logger.warning("Could not list Image Builder recipes. Error: %s", e)
+        
+        return None
+
+    def _get_existing_component_arn(self, name: str, version: str) -> Optional[str]:
+        """
+        指定された名前とバージョンの既存コンポーネントのARNを取得する。
+        見つからない場合はNoneを返す。
+        """
+        return self._index_existing_components().get((name, version))
+
+    def _get_existing_recipe_arn(self, name: str, version: str) -> Optional[str]:
+        """
+        指定された名前とバージョンの既存レシピのARNを取得する。
+        見つからない場合はNoneを返す。
+        """
+        # まず想定される ARN で直接 get_image_recipe を試す（存在しなければ一覧の走査は不要）
+        expected_arn = f"{self._arn_prefix}:image-recipe/{name}/{version}"
+        try:
+            response = self.imagebuilder_client.get_image_recipe(imageRecipeArn=expected_arn)
+            if response and 'imageRecipe' in response:
+                logger.debug("Found recipe via direct ARN lookup: %s", expected_arn)
+                return expected_arn
+        except self.imagebuilder_client.exceptions.ResourceNotFoundException:
+            logger.debug("Recipe not found via direct ARN lookup: %s", expected_arn)
+            return None
+        except Exception as direct_error:
+            logger.debug("Direct ARN lookup failed, falling back to list_image_recipes: %s", direct_error)
+        
+        arn = self._find_recipe_arn_by_name(name, version)
+        if arn:
+            logger.debug("Match found! ARN: %s", arn)
+        else:
+            logger.debug("No matching recipe found for %s v%s", name, version)
+        return arn
+
+    def _create_components(self) -> Dict[str, Any]: # 戻り値の型を CfnComponent から Any に変更
+        """コンポーネントを作成（既存の場合は参照）"""
+        components = {}
+        
+        for component_name, component_data in self.components_data.items():
+            version = component_data['Version']
+            # _get_existing_component_arn から返されるのはビルドバージョンARN
+            existing_arn = self._get_existing_component_arn(component_name, version)
+            
+            if existing_arn:
+                print(f"Component '{component_name}' v{version}' already exists. Using ARN: {existing_arn}")
+                # 既存のARNを使用するダミーオブジェクトを作成
+                components[component_name] = ExistingImageBuilderComponent(existing_arn)
+            else:
+                print(f"Creating new Component '{component_name}' v{version}'...")
+                component = imagebuilder.CfnComponent(
+                    self, f"Component{component_name}",
+                    name=component_data['Name'],
+                    platform=component_data['Platform'],
+                    version=component_data['Version'],
+                    data=component_data['Data']
+                )
+                components[component_name] = component
+        
+        return components
+    
+    def _create_recipe(self) -> Any: # 戻り値の型を CfnImageRecipe から Any に変更
+        """レシピを作成（既存の場合は参照）"""
+        recipe_name = self.recipe_data['Name']
+        recipe_version = self.recipe_data['Version']
+        existing_arn = self._existing_recipe_arn
+        self._recipe_is_new = not existing_arn
+
+        if existing_arn:
+            print(f"Image Recipe '{recipe_name}' v{recipe_version}' already exists. Using ARN: {existing_arn}")
+            self.recipe = ExistingImageBuilderRecipe(existing_arn) # self.recipe に直接設定
+        else:
+            print(f"Creating new Image Recipe '{recipe_name}' v{recipe_version}'...")
+            # コンポーネント参照を構築（同じコンポーネントが複数回指定されても一度だけ参照する）
+            seen = set()
+            component_refs = []
+            # resolve_recipe_components を経ていないレシピデータの場合は Components から平坦化する
+            flat_components = self.recipe_data.get('_flat_components')
+            if flat_components is None:
+                flat_components = [
+                    (component_name, component_info.get('Version'))
+                    for component_config in self.recipe_data.get('Components', [])
+                    for component_name, component_info in component_config.items()
+                ]
+            for component_name, _ in flat_components:
+                if component_name in self.components and component_name not in seen:
+                    seen.add(component_name)
+                    component_refs.append(
+                        imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                            component_arn=self.components[component_name].attr_arn
+                        )
+                    )
+            
+            # ブロックデバイスマッピング
+            block_device_mappings = []
+            for mapping in self.recipe_data.get('BlockDeviceMappings', []):
+                block_device_mappings.append(
+                    imagebuilder.CfnImageRecipe.InstanceBlockDeviceMappingProperty(
+                        device_name=mapping['DeviceName'],
+                        ebs=self._ebs_property(mapping.get('Ebs', {}))
+                    )
+                )
+            
+            self.recipe = imagebuilder.CfnImageRecipe( # self.recipe に直接設定
+                self, "ImageRecipe",
+                name=recipe_name,
+                version=recipe_version,
+                parent_image=f"arn:{self._partition}:imagebuilder:{self.region}:aws:image/{self.recipe_data['ParentImage']['Name']}/{self.recipe_data['ParentImage']['Version']}",
+                components=component_refs,
+                block_device_mappings=block_device_mappings if block_device_mappings else None
+            )
+        
+        return self.recipe
+
+
+    @classmethod
+    def _ebs_property(cls, ebs_config: Dict[str, Any]) -> imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty:
+        """Ebs 設定からプロパティを作成（デフォルト値どおりであれば共有のプロパティを返す）"""
+        values = {key: ebs_config.get(key, default) for key, default in cls._DEFAULT_EBS_CONFIG.items()}
+        if values == cls._DEFAULT_EBS_CONFIG:
+            return cls._DEFAULT_EBS
+        
+        return imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty(
+            delete_on_termination=values['DeleteOnTermination'],
+            volume_size=values['VolumeSize'],
+            volume_type=values['VolumeType']
+        )
+
+    def _create_infrastructure_config(self) -> imagebuilder.CfnInfrastructureConfiguration:
+        """インフラストラクチャ設定を作成"""
+        # サブネットが CDK コンテキスト (-c subnet_id=...) か IB_SUBNET_ID で指定されていれば
+        # VPC の lookup (DescribeVpcs/DescribeSubnets) を省略する
+        subnet_id = self.node.try_get_context('subnet_id') or os.environ.get('IB_SUBNET_ID')
+        if not subnet_id:
+            # デフォルトVPCとサブネットを取得
+            vpc = ec2.Vpc.from_lookup(self, "DefaultVPC", is_default=True)
+            subnet_id = vpc.public_subnets[0].subnet_id
+        
+        return imagebuilder.CfnInfrastructureConfiguration(
+            self, "InfrastructureConfig",
+            name=f"{self.recipe_data['Name']}-infrastructure",
+            instance_profile_name=self.instance_profile.ref,
+            instance_types=["t3.medium"],
+            subnet_id=subnet_id,
+            security_group_ids=[
+                "sg-0a43fd22ebc3702be", # このSGがImage Builderインスタンスからの必要な通信を許可しているか確認
+            ],
+            terminate_instance_on_failure=True,
+        )
+    
+    def _create_distribution_config(self) -> imagebuilder.CfnDistributionConfiguration:
+        """配布設定を作成"""
+        return imagebuilder.CfnDistributionConfiguration(
+            self, "DistributionConfig",
+            name=f"{self.recipe_data['Name']}-distribution",
+            distributions=[
+                imagebuilder.CfnDistributionConfiguration.DistributionProperty(
+                    region=self.region,
+                    ami_distribution_configuration=imagebuilder.CfnDistributionConfiguration.AmiDistributionConfigurationProperty(
+                        name=f"{self.recipe_data['Name']} {{{{ imagebuilder:buildDate }}}}",
+                        description=f"Generated by Image Builder Pipeline for {self.recipe_data['Name']}"
+                    )
+                )
+            ]
+        )
+    
+    def _create_image_pipeline(self) -> imagebuilder.CfnImagePipeline:
+        """イメージパイプラインを作成"""
+        return imagebuilder.CfnImagePipeline(
+            self, "ImagePipeline",
+            name=f"{self.recipe_data['Name']}-pipeline",
+            image_recipe_arn=self.recipe.attr_arn,
+            infrastructure_configuration_arn=self.infrastructure_config.attr_arn,
+            distribution_configuration_arn=self.distribution_config.attr_arn,
+            status="ENABLED"
+        )
+    
+    def _create_outputs(self):
+        """スタックの出力を作成"""
+        CfnOutput(
+            self, "ImagePipelineArn",
+            value=self.image_pipeline.attr_arn,
+            description="Image Builder Pipeline ARN"
+        )
+        
+        CfnOutput(
+            self, "ImageRecipeArn",
+            value=self.recipe.attr_arn,
+            description="Image Recipe ARN" if self._recipe_is_new else "Image Recipe ARN (Existing)"
+        )